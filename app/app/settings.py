@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 import os
+import sys
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -111,6 +113,24 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hashing every test user with PBKDF2 dominates the suite's CPU time,
+# so tests use Django's documented fast-hasher override. The suite also
+# runs against in-memory SQLite: schema creation is instantaneous and
+# per-test inserts skip the Postgres round-trip; no Postgres-specific
+# features are exercised. SERIALIZE is off because no test uses
+# serialized rollback emulation.
+if "test" in sys.argv:
+    PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+        "TEST": {"SERIALIZE": False},
+    }
+    # Image-upload tests write real files; keep them out of the shared
+    # /vol mount so workers from `manage.py test --parallel` (and plain
+    # local runs without the Docker volume) never collide
+    MEDIA_ROOT = tempfile.mkdtemp(prefix="recipe-test-media-")
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
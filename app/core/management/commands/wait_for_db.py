@@ -3,24 +3,35 @@ Django command to wait for the database to be available.
 """
 import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db.utils import OperationalError
 from psycopg2 import OperationalError as Psycopg2Error
 
 
 class Command(BaseCommand):
+    max_retries = 60
+    initial_interval = 0.1
+    max_interval = 5.0
+
     def handle(self, *args, **options):
         """Entrypoint for command"""
         self.stdout.write("Waiting for database...")
-        db_connnection = None
-        while not db_connnection:
+        interval = self.initial_interval
+        for _ in range(self.max_retries):
             try:
                 self.check(databases=["default"])
-                db_connnection = True
             except (OperationalError, Psycopg2Error):
-                self.stdout.write("Database unavailable, waiting 1 second...")
-                time.sleep(1)
-        self.stdout.write("Database available!")
+                self.stdout.write(
+                    f"Database unavailable, waiting {interval:.1f} seconds..."
+                )
+                time.sleep(interval)
+                interval = min(interval * 1.5, self.max_interval)
+            else:
+                self.stdout.write("Database available!")
+                return
+        raise CommandError(
+            f"Database unavailable after {self.max_retries} attempts"
+        )
 
     def check(self, *args, **options):
         pass
@@ -2,6 +2,7 @@
 Serializers for the Recipe API
 """
 
+from django.db import transaction
 from rest_framework import serializers
 
 from core.models import Ingredient, Recipe, Tag
@@ -32,6 +33,15 @@ class RecipeSerializer(serializers.ModelSerializer):
     Serializer for the Recipe model
     """
 
+    # Declared explicitly so DRF skips the model-introspection field
+    # mapping every time the serializer class is instantiated
+    id = serializers.IntegerField(read_only=True)
+    title = serializers.CharField(max_length=255)
+    time_minutes = serializers.IntegerField()
+    price = serializers.DecimalField(max_digits=5, decimal_places=2)
+    link = serializers.CharField(
+        max_length=255, required=False, allow_blank=True
+    )
     tags = TagSerializer(many=True, required=False,)
     ingredients = IngredientSerializer(many=True, required=False,)
 
@@ -48,20 +58,56 @@ class RecipeSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id"]
 
+    def _bulk_get_or_create(self, model, items, recipe_m2m):
+        """Batch get or create attrs and attach them to the recipe"""
+        if not items:
+            return
+        auth_user = self.context["request"].user
+        names = {item["name"] for item in items}
+        existing = {
+            obj.name: obj
+            for obj in model.objects.filter(user=auth_user, name__in=names)
+        }
+        missing = [
+            model(user=auth_user, name=name)
+            for name in names - existing.keys()
+        ]
+        if missing:
+            model.objects.bulk_create(missing, ignore_conflicts=True)
+            # ignore_conflicts means no primary keys are returned,
+            # so re-fetch the full set in one query
+            existing = {
+                obj.name: obj
+                for obj in model.objects.filter(
+                    user=auth_user, name__in=names
+                )
+            }
+        # go through the m2m through model directly so attaching is a
+        # single INSERT regardless of how many rows are linked
+        through = recipe_m2m.through
+        source_attr = f"{recipe_m2m.source_field_name}_id"
+        target_attr = f"{recipe_m2m.target_field_name}_id"
+        through.objects.bulk_create(
+            [
+                through(**{
+                    source_attr: recipe_m2m.instance.pk,
+                    target_attr: obj.pk,
+                })
+                for obj in existing.values()
+            ],
+            ignore_conflicts=True,
+        )
+
     def _get_or_create_tags(self, tags_data, recipe):
         """Handling getting or crreating tags """
-        auth_user = self.context["request"].user
-        for tag in tags_data:
-            tag_obj, _ = Tag.objects.get_or_create(user=auth_user, **tag)
-            recipe.tags.add(tag_obj)
+        self._bulk_get_or_create(Tag, tags_data, recipe.tags)
 
     def _get_or_create_ingredients(self, ingredients_data, recipe):
         """Handling getting or crreating tags """
-        auth_user = self.context["request"].user
-        for i in ingredients_data:
-            ing_obj, _ = Ingredient.objects.get_or_create(user=auth_user, **i)
-            recipe.ingredients.add(ing_obj)
+        self._bulk_get_or_create(Ingredient, ingredients_data,
+                                 recipe.ingredients)
 
+    @transaction.atomic
     def create(self, validated_data):
         tags_data = validated_data.pop("tags", [])
         ingredients_data = validated_data.pop("ingredients", [])
@@ -71,6 +117,7 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update recipe"""
         tags_data = validated_data.pop("tags", None)
@@ -83,10 +130,12 @@ class RecipeSerializer(serializers.ModelSerializer):
             instance.ingredients.clear()
             self._get_or_create_ingredients(ingredients_data, instance)
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-
-        instance.save()
+        if validated_data:
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            # m2m-only PATCHes skip the UPDATE entirely, and listing the
+            # touched fields saves rewriting unchanged columns
+            instance.save(update_fields=list(validated_data.keys()))
 
         return instance
 
@@ -52,9 +52,12 @@ class PrivateIngredientsApiTest(TestCase):
     Test the private ingredients API
     """
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+
     def setUp(self):
         self.client = APIClient()
-        self.user = create_user()
         self.client.force_authenticate(user=self.user)
 
     def test_retrieve_ingredient_list(self):
@@ -44,8 +44,11 @@ class PublicTagsApiTest(TestCase):
 class PrivateTagsApiTest(TestCase):
     """Test authenticated API requests"""
 
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+
     def setUp(self):
-        self.user = create_user()
         self.client = APIClient()
         self.client.force_authenticate(self.user)
 
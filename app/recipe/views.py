@@ -10,6 +10,7 @@ from drf_spectacular.utils import (
     extend_schema,
     extend_schema_view,
 )
+from django.db.models import Prefetch
 from rest_framework import mixins, status, viewsets
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
@@ -44,7 +45,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = serializers.RecipeDetailSerializer
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.prefetch_related(
+        Prefetch("tags", queryset=Tag.objects.only("id", "name")),
+        Prefetch(
+            "ingredients", queryset=Ingredient.objects.only("id", "name")
+        ),
+    )
 
     def get_queryset(self):
         """
@@ -61,9 +67,21 @@ class RecipeViewSet(viewsets.ModelViewSet):
             ingredient_ids = self._params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
 
-        return (
+        queryset = (
             queryset.filter(user=self.request.user).order_by("-id").distinct()
         )
+        if self.action == "list":
+            # RecipeSerializer never reads description or image, so the
+            # list response can skip fetching them
+            queryset = queryset.only(
+                "id", "title", "time_minutes", "price", "link"
+            )
+        else:
+            # detail and write paths load the owner in the same query
+            # instead of lazily per recipe
+            queryset = queryset.select_related("user")
+
+        return queryset
 
     def _params_to_ints(self, query_params):
         """